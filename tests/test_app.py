@@ -0,0 +1,341 @@
+import os
+import threading
+import time
+
+import pytest
+
+import app as render_app
+
+AUDIO = "https://cdn.example.com/audio.mp3"
+
+
+def payload(**extra):
+    data = {
+        "size": {"w": 640, "h": 360},
+        "fps": 24,
+        "audio_url": AUDIO,
+        "scenes": [
+            {"image_url": "https://cdn.example.com/1.jpg", "seconds": 2},
+            {"image_url": "https://cdn.example.com/2.jpg", "seconds": 3},
+        ],
+    }
+    data.update(extra)
+    return data
+
+
+@pytest.fixture
+def client():
+    return render_app.app.test_client()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Reemplaza run_render (sin red ni ffmpeg) y guarda los requests recibidos."""
+    calls = []
+
+    def fake_run_render(req, on_progress=None):
+        calls.append(req)
+        return {
+            "status": "ok",
+            "video_url": "https://res.cloudinary.com/demo/video/upload/x.mp4",
+            "meta": {"w": req.W, "h": req.H, "fps": req.fps, "scenes": len(req.scenes)},
+        }, 200
+
+    monkeypatch.setattr(render_app, "run_render", fake_run_render)
+    return calls
+
+
+def test_health(client):
+    assert client.get("/healthz").data == b"ok"
+    assert client.get("/").get_json() == {"ok": True, "service": "yt-render-ffmpeg"}
+
+
+def test_render_minimal_payload(client, renders):
+    r = client.post("/render", json=payload())
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["status"] == "ok"
+    assert body["video_url"].startswith("https://")
+    assert body["meta"] == {"w": 640, "h": 360, "fps": 24, "scenes": 2}
+
+    req = renders[0]
+    assert req.audio_url == AUDIO
+    assert req.scenes == [
+        (1, "https://cdn.example.com/1.jpg", 2.0),
+        (2, "https://cdn.example.com/2.jpg", 3.0),
+    ]
+
+
+def test_render_skips_unusable_scenes(client, renders):
+    scenes = [
+        {"image_url": "", "seconds": 2},
+        {"image_url": "'https://cdn.example.com/ok.jpg'", "seconds": 4},
+        {"image_url": "https://cdn.example.com/zero.jpg", "seconds": 0},
+    ]
+    assert client.post("/render", json=payload(scenes=scenes)).status_code == 200
+    assert renders[0].scenes == [(2, "https://cdn.example.com/ok.jpg", 4.0)]
+
+
+@pytest.mark.parametrize("extra, error", [
+    ({"scenes": []}, "scenes vacío"),
+    ({"audio_url": ""}, "audio_url vacío"),
+    ({"scenes": [{"image_url": "", "seconds": 2}]}, "No se generaron segmentos"),
+])
+def test_render_rejects_empty_payload(client, renders, extra, error):
+    r = client.post("/render", json=payload(**extra))
+    assert r.status_code == 400
+    assert r.get_json() == {"status": "error", "error": error}
+    assert renders == []
+
+
+@pytest.mark.parametrize("extra", [{"fps": "x"}, {"size": {"w": "ancho"}}, {"scenes": ["nope"]}])
+def test_render_rejects_malformed_payload(client, renders, extra):
+    r = client.post("/render", json=payload(**extra))
+    assert r.status_code == 400
+    body = r.get_json()
+    assert body["status"] == "error"
+    assert body["error"].startswith("Payload inválido")
+    assert renders == []
+
+
+def test_render_rejects_non_json(client, renders):
+    r = client.post("/render", data="no es json", content_type="text/plain")
+    assert r.status_code == 400
+    assert r.get_json()["status"] == "error"
+    assert renders == []
+
+
+@pytest.mark.parametrize("extra, error", [
+    ({"size": {"w": 8, "h": 360}}, "size fuera de rango"),
+    ({"size": {"w": 640, "h": 4000}}, "size fuera de rango"),
+    ({"size": {"w": 641, "h": 360}}, "size debe ser par"),
+    ({"fps": 0}, "fps fuera de rango"),
+    ({"fps": 61}, "fps fuera de rango"),
+    ({"scenes": [{"image_url": "https://cdn.example.com/1.jpg", "seconds": 1}] * 501}, "Demasiadas escenas"),
+    ({"scenes": [{"image_url": "https://cdn.example.com/1.jpg", "seconds": 1800}] * 3}, "Duración total"),
+    ({"async": "false "}, "async inválido"),
+    ({"async": "yes"}, "async inválido"),
+])
+def test_render_rejects_out_of_bounds(client, renders, extra, error):
+    r = client.post("/render", json=payload(**extra))
+    assert r.status_code == 400
+    body = r.get_json()
+    assert body["status"] == "error"
+    assert body["error"].startswith(error)
+    assert renders == []
+
+
+@pytest.mark.parametrize("extra", [
+    {"size": {"w": 16, "h": 16}},
+    {"size": {"w": 3840, "h": 2160}, "fps": 60},
+    {"fps": 1},
+    {"scenes": [{"image_url": "https://cdn.example.com/1.jpg", "seconds": 7.2}] * 500},
+])
+def test_render_accepts_limits(client, renders, extra):
+    assert client.post("/render", json=payload(**extra)).status_code == 200
+
+
+@pytest.mark.parametrize("value", [False, None, "false", "0"])
+def test_async_false_values_render_inline(client, renders, value):
+    r = client.post("/render", json=payload(**{"async": value}))
+    assert r.status_code == 200
+    assert renders[0].run_async is False
+
+
+@pytest.mark.parametrize("value", [True, "true", "1"])
+def test_async_true_values(value):
+    req = render_app.RenderRequest.from_json(payload(**{"async": value}))
+    assert req.run_async is True
+
+
+def test_async_disabled_by_default(client, renders, monkeypatch):
+    monkeypatch.setattr(render_app, "RENDER_ASYNC", False)
+    r = client.post("/render", json=payload(**{"async": True}))
+    assert r.status_code == 400
+    assert r.get_json() == {"status": "error", "error": "async deshabilitado en este despliegue"}
+    assert renders == []
+
+
+@pytest.fixture
+def async_jobs(monkeypatch):
+    monkeypatch.setattr(render_app, "RENDER_ASYNC", True)
+    monkeypatch.setattr(render_app, "_jobs", {})
+
+
+def wait_job(client, status_url):
+    for _ in range(200):
+        body = client.get(status_url).get_json()
+        if body["state"] in ("done", "error"):
+            return body
+        time.sleep(0.01)
+    raise AssertionError(f"job sin terminar: {body}")
+
+
+def test_async_render_and_status(client, renders, async_jobs):
+    r = client.post("/render", json=payload(**{"async": True}))
+    assert r.status_code == 202
+    body = r.get_json()
+    assert body["status"] == "accepted"
+    assert body["status_url"] == f"/status/{body['job_id']}"
+
+    job = wait_job(client, body["status_url"])
+    assert job["status"] == "ok"
+    assert job["job_id"] == body["job_id"]
+    assert job["state"] == "done"
+    assert job["progress"] == 100.0
+    assert job["result"]["status"] == "ok"
+    assert job["result"]["meta"]["scenes"] == 2
+    assert renders[0].run_async is True
+
+
+def test_async_render_error_is_reported(client, async_jobs, monkeypatch):
+    monkeypatch.setattr(render_app, "run_render", lambda req, on_progress=None: ({"status": "error", "error": "boom"}, 500))
+    body = client.post("/render", json=payload(**{"async": True})).get_json()
+    job = wait_job(client, body["status_url"])
+    assert job["state"] == "error"
+    assert job["result"] == {"status": "error", "error": "boom"}
+
+
+def test_async_queue_is_capped(client, renders, async_jobs, monkeypatch):
+    monkeypatch.setattr(render_app, "RENDER_MAX_JOBS", 1)
+    render_app._jobs["busy"] = {"state": "running", "progress": 0.0, "created": 0, "updated": time.time()}
+    r = client.post("/render", json=payload(**{"async": True}))
+    assert r.status_code == 429
+    assert r.get_json()["status"] == "error"
+    assert renders == []
+
+
+def test_status_unknown_job(client):
+    r = client.get("/status/nope")
+    assert r.status_code == 404
+    assert r.get_json() == {"status": "error", "error": "job no encontrado"}
+
+
+@pytest.fixture
+def img_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_app, "IMG_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(render_app, "IMG_CACHE_MAX_BYTES", 10)
+    monkeypatch.setattr(render_app, "IMG_CACHE_MAX_AGE", 3600)
+    monkeypatch.setattr(render_app, "_img_cache_stats", {"bytes": None, "swept": 0.0})
+    return tmp_path
+
+
+def test_image_cache_hit_and_expiry(img_cache):
+    path = str(img_cache / "a.jpg")
+    render_app.cache_put(path, b"12345")
+    assert render_app.cache_get(path) == b"12345"
+
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+    assert render_app.cache_get(path) is None
+    assert not os.path.exists(path)
+
+
+def test_image_cache_evicts_least_recently_used(img_cache):
+    a, b = str(img_cache / "a.jpg"), str(img_cache / "b.jpg")
+    render_app.cache_put(a, b"aaaa")
+    render_app.cache_put(b, b"bbbb")
+    now = time.time()
+    os.utime(a, (now - 60, now - 60))
+    os.utime(b, (now - 120, now - 60))
+    render_app.cache_put(str(img_cache / "c.jpg"), b"cccc")
+    assert sorted(os.listdir(img_cache)) == ["a.jpg", "c.jpg"]
+
+
+
+def test_image_cache_sweeps_only_over_cap_or_when_due(img_cache, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(render_app.os, "scandir", lambda path: scans.append(path) or scandir(path))
+    monkeypatch.setattr(render_app, "IMG_CACHE_MAX_BYTES", 100)
+    for name in ("a", "b", "c", "d"):
+        render_app.cache_put(str(img_cache / f"{name}.jpg"), b"1234")
+    assert len(scans) == 1  # el primero mide el directorio; el resto solo suma
+
+    render_app._img_cache_stats["swept"] -= render_app.IMG_CACHE_SWEEP_SECS
+    render_app.cache_put(str(img_cache / "e.jpg"), b"1234")
+    assert len(scans) == 2
+    assert render_app._img_cache_stats["bytes"] == 20
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (10, [(1, "a", 2.0), (2, "b", 3.0), (3, "c", 4.0)]),
+    (9, [(1, "a", 2.0), (2, "b", 3.0), (3, "c", 4.0)]),
+    (6.5, [(1, "a", 2.0), (2, "b", 3.0), (3, "c", 1.5)]),
+    (5, [(1, "a", 2.0), (2, "b", 3.0)]),
+    (1, [(1, "a", 1.0)]),
+])
+def test_fit_scenes_trims_to_audio(limit, expected):
+    scenes = [(1, "a", 2.0), (2, "b", 3.0), (3, "c", 4.0)]
+    assert render_app.fit_scenes(scenes, limit) == expected
+
+
+def test_render_without_free_slot_returns_503(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(render_app, "_ffmpeg_slots", slots)
+    monkeypatch.setattr(render_app, "RENDER_TIMEOUT", 0.05)
+    r = client.post("/render", json=payload())
+    assert r.status_code == 503
+    body = r.get_json()
+    assert body["status"] == "error"
+    assert body["error"].startswith("No hay cupo para renderizar")
+
+
+def test_feed_scenes_keeps_only_prefetch_window(monkeypatch):
+    from concurrent.futures import Future
+
+    monkeypatch.setattr(render_app, "RENDER_PREFETCH", 3)
+    count = 10
+    futs, held, fed = {}, [], []
+
+    def fetch(k):
+        if k < count:
+            fut = Future()
+            fut.set_result(f"img{k}".encode())
+            futs[k] = fut
+        held.append(len(futs))
+
+    def fake_copy(src, path, stop):
+        held.append(len(futs))
+        fed.append((path, src.read()))
+        return True
+
+    monkeypatch.setattr(render_app, "copy_to_fifo", fake_copy)
+    for k in range(render_app.RENDER_PREFETCH):
+        fetch(k)
+    fifos = [f"scene_{k}" for k in range(count)] + ["scene_last"]
+    render_app.feed_scenes(futs, fetch, fifos, threading.Event())
+
+    assert max(held) <= render_app.RENDER_PREFETCH
+    assert not futs
+    assert [data for _, data in fed] == [f"img{k}".encode() for k in range(count)] + [b"img9"]
+    assert [path for path, _ in fed] == fifos
+
+
+def test_render_deadline_covers_audio_download(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(render_app, "_ffmpeg_slots", slots)
+    monkeypatch.setattr(render_app, "RENDER_TIMEOUT", 0.2)
+    monkeypatch.setattr(render_app, "fetch_to_file", lambda url, path, stop: stop.wait(10))
+    monkeypatch.setattr(render_app, "load_scene", lambda url, W, H: b"jpeg")
+    start = time.monotonic()
+    r = client.post("/render", json=payload())
+    assert time.monotonic() - start < 2
+    assert r.status_code == 500
+    assert "timed out" in r.get_json()["error"]
+    assert slots.acquire(timeout=0)
+
+
+def test_load_scene_does_not_open_url_when_ffmpeg_fails_to_start(monkeypatch):
+    opened = []
+    monkeypatch.setattr(render_app, "IMG_CACHE_MAX_BYTES", 0)
+    monkeypatch.setattr(render_app, "open_url", lambda url: opened.append(url))
+
+    def no_ffmpeg(*args, **kwargs):
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(render_app.subprocess, "Popen", no_ffmpeg)
+    with pytest.raises(FileNotFoundError):
+        render_app.load_scene("https://cdn.example.com/1.jpg", 640, 360)
+    assert opened == []